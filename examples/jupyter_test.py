@@ -6,19 +6,29 @@ Test persistent interpreter mode with state retention
 import requests
 import time
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 API_URL = "http://localhost:8080/api/v1"
 AUTH_HEADER = {"Authorization": "ApiKey dev_jupyter_test"}
 
+# One keep-alive session for every call instead of a new connection each time
+_session = requests.Session()
+_session.headers.update(AUTH_HEADER)
+
 def execute(code, persistent=False):
     """Execute code and return result"""
-    response = requests.post(
+    response = _session.post(
         f"{API_URL}/execute",
         json={
             "code": code,
             "persistent": persistent
         },
-        headers=AUTH_HEADER
     )
+    if orjson is not None:
+        return orjson.loads(response.content)
     return response.json()
 
 def main():
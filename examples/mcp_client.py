@@ -7,13 +7,33 @@ Demonstrates how to use the Model Context Protocol to interact with CAGE
 import asyncio
 import json
 import websockets
-import uuid
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Faster JSON when orjson is installed; CAGE reads text frames, so send str
+if orjson is not None:
+    def dumps(obj):
+        return orjson.dumps(obj).decode("utf-8")
+
+    loads = orjson.loads
+else:
+    dumps = json.dumps
+    loads = json.loads
 
 class CAGEMCPClient:
     def __init__(self, url="ws://localhost:8080/mcp", user_id="example_user"):
         self.url = url
         self.user_id = user_id
         self.ws = None
+        self._next_id = 1  # initialize uses id 1
+
+    def _new_id(self):
+        """Next JSON-RPC request id (a plain counter is enough per connection)"""
+        self._next_id += 1
+        return self._next_id
 
     async def connect(self):
         """Connect to CAGE MCP WebSocket"""
@@ -33,8 +53,8 @@ class CAGEMCPClient:
             }
         }
 
-        await self.ws.send(json.dumps(init_request))
-        response = json.loads(await self.ws.recv())
+        await self.ws.send(dumps(init_request))
+        response = loads(await self.ws.recv())
 
         if "error" in response:
             raise Exception(f"Initialize failed: {response['error']}")
@@ -47,12 +67,12 @@ class CAGEMCPClient:
         """List available tools"""
         request = {
             "jsonrpc": "2.0",
-            "id": 2,
+            "id": self._new_id(),
             "method": "tools/list"
         }
 
-        await self.ws.send(json.dumps(request))
-        response = json.loads(await self.ws.recv())
+        await self.ws.send(dumps(request))
+        response = loads(await self.ws.recv())
 
         if "error" in response:
             raise Exception(f"Error: {response['error']}")
@@ -63,7 +83,7 @@ class CAGEMCPClient:
         """Execute code via MCP tool"""
         request = {
             "jsonrpc": "2.0",
-            "id": str(uuid.uuid4()),
+            "id": self._new_id(),
             "method": "tools/call",
             "params": {
                 "name": "execute_code",
@@ -76,8 +96,8 @@ class CAGEMCPClient:
             }
         }
 
-        await self.ws.send(json.dumps(request))
-        response = json.loads(await self.ws.recv())
+        await self.ws.send(dumps(request))
+        response = loads(await self.ws.recv())
 
         if "error" in response:
             return {"error": response['error']['message']}
@@ -88,7 +108,7 @@ class CAGEMCPClient:
         """List files via MCP"""
         request = {
             "jsonrpc": "2.0",
-            "id": str(uuid.uuid4()),
+            "id": self._new_id(),
             "method": "tools/call",
             "params": {
                 "name": "list_files",
@@ -96,8 +116,8 @@ class CAGEMCPClient:
             }
         }
 
-        await self.ws.send(json.dumps(request))
-        response = json.loads(await self.ws.recv())
+        await self.ws.send(dumps(request))
+        response = loads(await self.ws.recv())
 
         if "error" in response:
             return {"error": response['error']['message']}
@@ -5,11 +5,12 @@ use std::sync::Arc;
 use axum::{
     body::Body,
     extract::{Multipart, Path, Query, State},
-    http::{header, StatusCode},
+    http::{header, HeaderMap, StatusCode},
     response::Response,
     Json,
 };
 use serde::Deserialize;
+use sha2::{Digest, Sha256};
 
 use crate::api::{ApiError, UserAuth};
 use crate::models::{FileListResponse, FileUploadRequest, FileUploadResponse};
@@ -96,6 +97,7 @@ pub async fn download_file(
     State(state): State<Arc<AppState>>,
     auth: UserAuth,
     Path(filepath): Path<String>,
+    headers: HeaderMap,
 ) -> Result<Response, ApiError> {
     let contents = state
         .container_manager
@@ -109,6 +111,23 @@ pub async fn download_file(
             }
         })?;
 
+    // Same SHA-256 digest that upload returns as `checksum`
+    let etag = format!("\"{:x}\"", Sha256::digest(&contents));
+
+    let not_modified = headers
+        .get(header::IF_NONE_MATCH)
+        .and_then(|v| v.to_str().ok())
+        .map(|v| v.split(',').any(|tag| tag.trim() == etag || tag.trim() == "*"))
+        .unwrap_or(false);
+
+    if not_modified {
+        return Ok(Response::builder()
+            .status(StatusCode::NOT_MODIFIED)
+            .header(header::ETAG, etag)
+            .body(Body::empty())
+            .unwrap());
+    }
+
     // Determine content type from extension
     let content_type = mime_guess::from_path(&filepath)
         .first_or_octet_stream()
@@ -119,6 +138,7 @@ pub async fn download_file(
     Ok(Response::builder()
         .status(StatusCode::OK)
         .header(header::CONTENT_TYPE, content_type)
+        .header(header::ETAG, etag)
         .header(
             header::CONTENT_DISPOSITION,
             format!("attachment; filename=\"{}\"", filename),
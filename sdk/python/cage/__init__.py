@@ -5,7 +5,8 @@ This SDK provides a Python interface to the CAGE orchestrator API.
 """
 
 from .client import CAGEClient, CAGEError, ExecutionError, AuthenticationError
-from .mcp import MCPClient
+from .async_client import AsyncCAGEClient
+from .mcp import MCPClient, MCPSessionPool
 
 __version__ = "1.0.0"
-__all__ = ["CAGEClient", "MCPClient", "CAGEError", "ExecutionError", "AuthenticationError"]
+__all__ = ["CAGEClient", "AsyncCAGEClient", "MCPClient", "MCPSessionPool", "CAGEError", "ExecutionError", "AuthenticationError"]
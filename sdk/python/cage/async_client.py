@@ -0,0 +1,142 @@
+"""CAGE async REST API Client"""
+
+import asyncio
+from typing import Dict, List, Optional, Any
+
+from .client import CAGEError, AuthenticationError, ExecutionError, _build_execute_payload
+
+try:
+    import httpx
+except ImportError:
+    httpx = None  # type: ignore[assignment]
+
+
+class AsyncCAGEClient:
+    """
+    CAGE async REST API Client
+
+    Concurrent requests run in parallel instead of queueing behind each
+    other. Over ``https://`` they share one HTTP/2 connection (negotiated via
+    TLS ALPN); plain ``http://`` URLs use HTTP/1.1 across up to 32 connections.
+
+    Example:
+        >>> async def main():
+        ...     async with AsyncCAGEClient(api_key="dev_myuser") as client:
+        ...         results = await client.execute_many(["print(1)", "print(2)"])
+        ...         print([r['stdout'] for r in results])
+        >>> asyncio.run(main())
+    """
+
+    __slots__ = ("api_url", "api_key", "timeout", "_client", "_url_execute", "_url_health")
+
+    def __init__(
+        self,
+        api_url: str = "http://127.0.0.1:8080",
+        api_key: str = "dev_user",
+        timeout: int = 60,
+    ):
+        """
+        Initialize async CAGE client
+
+        Args:
+            api_url: Base URL of CAGE orchestrator
+            api_key: API key for authentication
+            timeout: Default request timeout in seconds
+        """
+        if httpx is None:
+            raise ImportError("httpx library required. Install with: pip install 'httpx[http2]'")
+
+        self.api_url = api_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+        self._url_execute = f"{self.api_url}/api/v1/execute"
+        self._url_health = f"{self.api_url}/health"
+        self._client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            timeout=timeout,
+            headers={
+                "Authorization": f"ApiKey {api_key}",
+                "Content-Type": "application/json",
+            },
+        )
+
+    async def execute(
+        self,
+        code: str,
+        language: str = "python",
+        timeout_seconds: Optional[int] = None,
+        persistent: bool = False,
+        env: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Execute code in sandbox
+
+        Args:
+            code: Code to execute
+            language: Programming language
+            timeout_seconds: Maximum execution time (default: 30)
+            persistent: Use persistent interpreter mode (Python only)
+            env: Additional environment variables
+
+        Returns:
+            Execution result with stdout, stderr, exit_code, etc.
+
+        Raises:
+            ExecutionError: If execution fails
+            AuthenticationError: If authentication fails
+        """
+        payload = _build_execute_payload(code, language, timeout_seconds, persistent, env)
+
+        try:
+            response = await self._client.post(self._url_execute, json=payload)
+        except httpx.HTTPError as e:
+            raise CAGEError(f"Request failed: {e}")
+
+        if response.status_code == 401:
+            raise AuthenticationError("Invalid API key")
+        elif response.status_code == 429:
+            raise ExecutionError("Rate limit exceeded")
+        elif not response.is_success:
+            error_data = response.json() if response.headers.get("content-type") == "application/json" else {}
+            raise ExecutionError(f"Execution failed: {error_data.get('message', response.text)}")
+
+        return response.json()
+
+    async def execute_many(
+        self,
+        codes: List[str],
+        language: str = "python",
+        timeout_seconds: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Execute independent snippets concurrently
+
+        Returns:
+            Execution results in the same order as ``codes``
+        """
+        return await asyncio.gather(*(
+            self.execute(code, language=language, timeout_seconds=timeout_seconds)
+            for code in codes
+        ))
+
+    async def health(self) -> Dict[str, Any]:
+        """Get server health status"""
+        response = await self._client.get(self._url_health)
+
+        if not response.is_success:
+            raise CAGEError(f"Health check failed: {response.text}")
+
+        return response.json()
+
+    async def close(self) -> None:
+        """Close the underlying HTTP connections"""
+        await self._client.aclose()
+
+    async def __aenter__(self) -> "AsyncCAGEClient":
+        """Async context manager entry"""
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        """Async context manager exit"""
+        await self.close()
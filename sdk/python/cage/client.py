@@ -1,8 +1,51 @@
 """CAGE REST API Client"""
 
 import base64
-from typing import Dict, List, Optional, Any
+import gzip
+import hashlib
+import json
+import os
+import tarfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Final, List, Optional, Any, Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None  # type: ignore[assignment]
+
+try:
+    from requests_toolbelt import MultipartEncoder
+except ImportError:
+    MultipartEncoder = None  # type: ignore[assignment]
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore[assignment]
+
+try:
+    from mypy_extensions import mypyc_attr
+except ImportError:
+    # Only the mypyc build needs the real decorator
+    def mypyc_attr(*attrs: str, **kwattrs: object) -> Any:  # type: ignore[misc]
+        return lambda cls: cls
+
+MSGPACK_CONTENT_TYPE: Final = "application/msgpack"
+DOWNLOAD_CHUNK_SIZE: Final = 1024 * 1024
+COMPRESS_THRESHOLD: Final = 4096
+ETAG_CACHE_MAX_BYTES: Final = 16 * 1024 * 1024
+ARCHIVE_CONTENT_TYPE: Final = "application/zstd"
+
+# Per-request override that drops the session's JSON Content-Type so requests
+# sets the multipart boundary itself; Authorization still comes from the session.
+# Typed as Any: requests' own annotations reject the None value it honours here
+_MULTIPART_HEADERS: Final[Dict[str, Any]] = {"Content-Type": None}
 
 
 class CAGEError(Exception):
@@ -20,6 +63,60 @@ class ExecutionError(CAGEError):
     pass
 
 
+def _build_execute_payload(
+    code: str,
+    language: str,
+    timeout_seconds: Optional[int],
+    persistent: bool,
+    env: Optional[Dict[str, str]],
+) -> Dict[str, Any]:
+    """Build the /api/v1/execute request body"""
+    payload: Dict[str, Any] = {
+        "code": code,
+        "language": language,
+        "persistent": persistent,
+    }
+
+    if timeout_seconds is not None:
+        payload["timeout_seconds"] = timeout_seconds
+
+    if env:
+        payload["env"] = env
+
+    return payload
+
+
+def _file_etag(path: str) -> str:
+    """Quoted SHA-256 hex digest of a local file, as served in the ETag header"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return f'"{digest.hexdigest()}"'
+
+
+def _safe_extract(archive: tarfile.TarFile, local_dir: str) -> None:
+    """Extract a streamed tar, refusing members that would escape local_dir"""
+    if hasattr(tarfile, "data_filter"):
+        try:
+            archive.extractall(local_dir, filter="data")
+        except tarfile.TarError as e:
+            # Includes FilterError/OutsideDestinationError from the data filter
+            raise CAGEError(f"Archive extraction failed: {e}") from e
+        return
+
+    root = os.path.realpath(local_dir)
+    for member in archive:
+        target = os.path.realpath(os.path.join(root, member.name))
+        if not (member.isfile() or member.isdir()) or os.path.commonpath([root, target]) != root:
+            raise CAGEError(f"Refusing to extract archive member {member.name!r}")
+        try:
+            archive.extract(member, root)
+        except tarfile.TarError as e:
+            raise CAGEError(f"Archive extraction failed: {e}") from e
+
+
+@mypyc_attr(allow_interpreted_subclasses=True)
 class CAGEClient:
     """
     CAGE REST API Client
@@ -31,13 +128,43 @@ class CAGEClient:
         >>> result = client.execute("print('Hello CAGE!')")
         >>> print(result['stdout'])
         Hello CAGE!
+
+    Instances use ``__slots__``; subclasses should declare ``__slots__`` for
+    any attributes they add to keep the per-instance savings.
     """
 
+    __slots__ = (
+        "api_url",
+        "api_key",
+        "timeout",
+        "use_msgpack",
+        "compress_requests",
+        "cache_downloads",
+        "_http_session",
+        "_post",
+        "_get",
+        "_delete",
+        "_etag_cache",
+        "_etag_cache_bytes",
+        "_etag_lock",
+        "_url_execute",
+        "_url_execute_async",
+        "_url_jobs",
+        "_url_files",
+        "_url_file",
+        "_url_archive",
+        "_url_session",
+        "_url_health",
+    )
+
     def __init__(
         self,
         api_url: str = "http://127.0.0.1:8080",
         api_key: str = "dev_user",
         timeout: int = 60,
+        use_msgpack: bool = False,
+        compress_requests: bool = False,
+        cache_downloads: bool = True,
     ):
         """
         Initialize CAGE client
@@ -46,16 +173,84 @@ class CAGEClient:
             api_url: Base URL of CAGE orchestrator
             api_key: API key for authentication
             timeout: Default request timeout in seconds
+            use_msgpack: Send execute requests as MessagePack (falls back to
+                JSON if the server does not accept it)
+            compress_requests: Compress execute bodies larger than 4 KiB with
+                zstd (gzip if zstandard is not installed); turned off again if
+                the server rejects a compressed body with 400/415
+            cache_downloads: Keep in-memory downloads (up to 16 MiB in total)
+                for ETag revalidation
         """
+        if use_msgpack and msgpack is None:
+            raise ImportError("msgpack library required. Install with: pip install msgpack")
+
         self.api_url = api_url.rstrip('/')
         self.api_key = api_key
         self.timeout = timeout
-        self._session = requests.Session()
-        self._session.headers.update({
+        self.use_msgpack = use_msgpack
+
+        # Endpoint URLs are fixed for the client's lifetime; per-id paths append to a prefix
+        self._url_execute = f"{self.api_url}/api/v1/execute"
+        self._url_execute_async = f"{self.api_url}/api/v1/execute/async"
+        self._url_jobs = f"{self.api_url}/api/v1/jobs/"
+        self._url_files = f"{self.api_url}/api/v1/files"
+        self._url_file = f"{self.api_url}/api/v1/files/"
+        self._url_archive = f"{self.api_url}/api/v1/files/archive"
+        self._url_session = f"{self.api_url}/api/v1/session"
+        self._url_health = f"{self.api_url}/health"
+
+        self.compress_requests = compress_requests
+        self.cache_downloads = cache_downloads
+        # file_path -> (ETag, content) for in-memory downloads, LRU ordered and
+        # bounded by total content size; the lock makes it safe across threads
+        self._etag_cache: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self._etag_cache_bytes = 0
+        self._etag_lock = threading.Lock()
+        session = requests.Session()
+        session.headers.update({
             "Authorization": f"ApiKey {api_key}",
             "Content-Type": "application/json",
+            # Every encoding urllib3 can decode here (adds zstd/br when available)
+            "Accept-Encoding": ACCEPT_ENCODING,
         })
 
+        # Keep connections alive across calls; only idempotent requests are retried
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            # raise_on_status=False hands the last response to our own error handling
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.1,
+                status_forcelist=[502, 503, 504],
+                raise_on_status=False,
+            ),
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        self._bind_session(session)
+
+    @property
+    def _session(self) -> requests.Session:
+        """The requests session all calls go through"""
+        return self._http_session
+
+    @_session.setter
+    def _session(self, session: requests.Session) -> None:
+        self._bind_session(session)
+
+    def _bind_session(self, session: requests.Session) -> None:
+        """Route all requests through ``session`` and re-cache its bound methods"""
+        self._http_session = session
+        self._post = session.post
+        self._get = session.get
+        self._delete = session.delete
+
+    def update_api_key(self, api_key: str) -> None:
+        """Switch to a new API key for all subsequent requests"""
+        self.api_key = api_key
+        self._session.headers["Authorization"] = f"ApiKey {api_key}"
+
     def execute(
         self,
         code: str,
@@ -81,24 +276,18 @@ class CAGEClient:
             ExecutionError: If execution fails
             AuthenticationError: If authentication fails
         """
-        payload = {
-            "code": code,
-            "language": language,
-            "persistent": persistent,
-        }
-
-        if timeout_seconds is not None:
-            payload["timeout_seconds"] = timeout_seconds
-
-        if env:
-            payload["env"] = env
+        payload = _build_execute_payload(code, language, timeout_seconds, persistent, env)
 
         try:
-            response = self._session.post(
-                f"{self.api_url}/api/v1/execute",
-                json=payload,
-                timeout=self.timeout,
-            )
+            response = self._post_execute(payload)
+            if response.status_code == 415 and "Content-Encoding" in response.request.headers:
+                # Server did not decode the compressed body; send plain bodies from now on
+                self.compress_requests = False
+                response = self._post_execute(payload)
+            if response.status_code == 415 and self.use_msgpack:
+                # Server only speaks JSON; stop offering msgpack
+                self.use_msgpack = False
+                response = self._post_execute(payload)
         except requests.RequestException as e:
             raise CAGEError(f"Request failed: {e}")
 
@@ -107,9 +296,48 @@ class CAGEClient:
         elif response.status_code == 429:
             raise ExecutionError("Rate limit exceeded")
         elif not response.ok:
-            error_data = response.json() if response.headers.get("content-type") == "application/json" else {}
+            content_type = response.headers.get("content-type", "")
+            if content_type.startswith(("application/json", MSGPACK_CONTENT_TYPE)):
+                error_data = self._decode_response(response)
+            else:
+                error_data = {}
             raise ExecutionError(f"Execution failed: {error_data.get('message', response.text)}")
 
+        return self._decode_response(response)
+
+    def _post_execute(self, payload: Dict[str, Any]) -> requests.Response:
+        """POST an execute payload using the negotiated wire format"""
+        if self.use_msgpack:
+            body = msgpack.packb(payload, use_bin_type=True)
+            headers = {
+                "Content-Type": MSGPACK_CONTENT_TYPE,
+                "Accept": f"{MSGPACK_CONTENT_TYPE}, application/json",
+            }
+        else:
+            body = json.dumps(payload).encode("utf-8")
+            headers = {}
+
+        if self.compress_requests and len(body) > COMPRESS_THRESHOLD:
+            if zstandard is not None:
+                # Compressors are not thread-safe; a fresh one per call is cheap
+                body = zstandard.ZstdCompressor(level=3).compress(body)
+                headers["Content-Encoding"] = "zstd"
+            else:
+                body = gzip.compress(body)
+                headers["Content-Encoding"] = "gzip"
+
+        return self._post(
+            self._url_execute,
+            data=body,
+            headers=headers,
+            timeout=self.timeout,
+        )
+
+    @staticmethod
+    def _decode_response(response: requests.Response) -> Dict[str, Any]:
+        """Decode a JSON or MessagePack response body"""
+        if response.headers.get("content-type", "").startswith(MSGPACK_CONTENT_TYPE):
+            return msgpack.unpackb(response.content, raw=False)
         return response.json()
 
     def execute_async(
@@ -124,7 +352,7 @@ class CAGEClient:
         Returns:
             job_id for polling status
         """
-        payload = {
+        payload: Dict[str, Any] = {
             "code": code,
             "language": language,
         }
@@ -132,8 +360,8 @@ class CAGEClient:
         if timeout_seconds is not None:
             payload["timeout_seconds"] = timeout_seconds
 
-        response = self._session.post(
-            f"{self.api_url}/api/v1/execute/async",
+        response = self._post(
+            self._url_execute_async,
             json=payload,
             timeout=self.timeout,
         )
@@ -145,8 +373,8 @@ class CAGEClient:
 
     def get_job_status(self, job_id: str) -> Dict[str, Any]:
         """Get async job status and result"""
-        response = self._session.get(
-            f"{self.api_url}/api/v1/jobs/{job_id}",
+        response = self._get(
+            self._url_jobs + job_id,
             timeout=self.timeout,
         )
 
@@ -173,54 +401,128 @@ class CAGEClient:
             Upload result with path, size, checksum
         """
         with open(file_path, 'rb') as f:
-            files = {'file': f}
-            data = {'path': target_path}
-
-            # Remove Content-Type header for multipart
-            headers = dict(self._session.headers)
-            headers.pop('Content-Type', None)
-
-            response = requests.post(
-                f"{self.api_url}/api/v1/files",
-                files=files,
-                data=data,
-                headers=headers,
-                timeout=self.timeout,
-            )
+            if MultipartEncoder is not None:
+                # Stream the multipart body from disk instead of buffering it
+                encoder = MultipartEncoder(fields={
+                    'path': target_path,
+                    'file': (os.path.basename(file_path), f),
+                })
+                response = self._post(
+                    self._url_files,
+                    data=encoder,
+                    headers={'Content-Type': encoder.content_type},
+                    timeout=self.timeout,
+                )
+            else:
+                response = self._post(
+                    self._url_files,
+                    files={'file': f},
+                    data={'path': target_path},
+                    headers=_MULTIPART_HEADERS,
+                    timeout=self.timeout,
+                )
 
         if not response.ok:
             raise CAGEError(f"Upload failed: {response.text}")
 
         return response.json()
 
-    def download_file(self, file_path: str, output_path: Optional[str] = None) -> bytes:
+    def download_file(self, file_path: str, output_path: Optional[str] = None) -> Optional[bytes]:
         """
         Download a file from workspace
 
+        Unchanged files are not transferred again: in-memory downloads are
+        revalidated against a cached ETag, and an existing output_path is
+        revalidated by its SHA-256 digest (the server's ETag).
+
+        A file named ``archive`` at the workspace root shares its URL with
+        the planned directory archive endpoint (see download_tree).
+
         Args:
             file_path: File path in workspace
             output_path: Optional local path to save (if None, returns content)
 
         Returns:
-            File content as bytes
+            File content as bytes, or None when streamed to output_path
         """
-        response = self._session.get(
-            f"{self.api_url}/api/v1/files/{file_path}",
-            timeout=self.timeout,
-        )
-
-        if response.status_code == 404:
-            raise CAGEError(f"File {file_path} not found")
-        elif not response.ok:
-            raise CAGEError(f"Download failed: {response.text}")
-
-        content = response.content
-
+        cached = None
         if output_path:
-            with open(output_path, 'wb') as f:
-                f.write(content)
-
-        return content
+            etag = _file_etag(output_path) if os.path.isfile(output_path) else None
+        else:
+            cached = self._cached_download(file_path)
+            etag = cached[0] if cached else None
+
+        with self._get(
+            self._url_file + file_path,
+            headers={"If-None-Match": etag} if etag else None,
+            stream=True,
+            timeout=self.timeout,
+        ) as response:
+            if response.status_code == 304:
+                if cached:
+                    return cached[1]
+                return None
+            elif response.status_code == 404:
+                self._forget_download(file_path)
+                raise CAGEError(f"File {file_path} not found")
+            elif not response.ok:
+                raise CAGEError(f"Download failed: {response.text}")
+
+            if not output_path:
+                content = response.content
+                self._cache_download(file_path, response.headers.get("ETag"), content)
+                return content
+
+            # Write beside output_path and swap it in only once complete, so a
+            # dropped connection never truncates the previous copy
+            part_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.part"
+            try:
+                with open(part_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                os.replace(part_path, output_path)
+            except BaseException:
+                try:
+                    os.remove(part_path)
+                except OSError:
+                    pass
+                raise
+
+        return None
+
+    def _cached_download(self, file_path: str) -> Optional[Tuple[str, bytes]]:
+        """Look up a cached (ETag, content) pair, marking it recently used"""
+        if not self.cache_downloads:
+            return None
+
+        with self._etag_lock:
+            cached = self._etag_cache.get(file_path)
+            if cached:
+                self._etag_cache.move_to_end(file_path)
+            return cached
+
+    def _cache_download(self, file_path: str, etag: Optional[str], content: bytes) -> None:
+        """Remember a downloaded body for ETag revalidation"""
+        with self._etag_lock:
+            old = self._etag_cache.pop(file_path, None)
+            if old:
+                self._etag_cache_bytes -= len(old[1])
+
+            if not self.cache_downloads or not etag or len(content) > ETAG_CACHE_MAX_BYTES:
+                return
+
+            self._etag_cache[file_path] = (etag, content)
+            self._etag_cache_bytes += len(content)
+            while self._etag_cache_bytes > ETAG_CACHE_MAX_BYTES:
+                _, (_, evicted) = self._etag_cache.popitem(last=False)
+                self._etag_cache_bytes -= len(evicted)
+
+    def _forget_download(self, file_path: str) -> None:
+        """Drop a cached download, e.g. after the file was deleted"""
+        with self._etag_lock:
+            old = self._etag_cache.pop(file_path, None)
+            if old:
+                self._etag_cache_bytes -= len(old[1])
 
     def list_files(self, path: str = "/", recursive: bool = False) -> List[Dict[str, Any]]:
         """
@@ -237,8 +539,8 @@ class CAGEClient:
         if recursive:
             params["recursive"] = "true"
 
-        response = self._session.get(
-            f"{self.api_url}/api/v1/files",
+        response = self._get(
+            self._url_files,
             params=params,
             timeout=self.timeout,
         )
@@ -248,13 +550,60 @@ class CAGEClient:
 
         return response.json()["files"]
 
-    def delete_file(self, file_path: str):
+    def download_tree(self, path: str = "/", local_dir: str = ".") -> None:
+        """
+        Download a workspace directory into a local directory
+
+        Fetches the whole subtree as a single zstd-compressed tar stream when
+        the server and the zstandard package support it, otherwise walks the
+        directory and downloads file by file. The archive endpoint
+        (``/api/v1/files/archive``) is not served by the current orchestrator,
+        which answers it with 404 or a workspace file named ``archive``; both
+        lead to the file-by-file fallback. Archive members that would land
+        outside local_dir, directly or through a link, raise CAGEError.
+
+        Args:
+            path: Directory path in workspace
+            local_dir: Local directory to extract into (created if missing)
+        """
+        os.makedirs(local_dir, exist_ok=True)
+
+        if zstandard is not None:
+            with self._get(
+                self._url_archive,
+                params={"path": path, "format": "tar.zst"},
+                stream=True,
+                timeout=self.timeout,
+            ) as response:
+                # Servers without the endpoint route this to a plain file download
+                if response.ok and response.headers.get("content-type") == ARCHIVE_CONTENT_TYPE:
+                    reader = zstandard.ZstdDecompressor().stream_reader(response.raw)  # type: ignore[arg-type]
+                    with tarfile.open(fileobj=reader, mode="r|") as archive:
+                        _safe_extract(archive, local_dir)
+                    return
+
+        root = path.rstrip('/')
+        pending = [path]
+        while pending:
+            for entry in self.list_files(pending.pop()):
+                relative = entry["path"][len(root):].strip('/')
+                target = os.path.join(local_dir, *relative.split('/'))
+
+                if entry["type"] == "directory":
+                    os.makedirs(target, exist_ok=True)
+                    pending.append(entry["path"])
+                else:
+                    self.download_file(entry["path"].lstrip('/'), output_path=target)
+
+    def delete_file(self, file_path: str) -> None:
         """Delete a file from workspace"""
-        response = self._session.delete(
-            f"{self.api_url}/api/v1/files/{file_path}",
+        response = self._delete(
+            self._url_file + file_path,
             timeout=self.timeout,
         )
 
+        self._forget_download(file_path)
+
         if response.status_code == 404:
             raise CAGEError(f"File {file_path} not found")
         elif not response.ok:
@@ -262,8 +611,8 @@ class CAGEClient:
 
     def get_session(self) -> Dict[str, Any]:
         """Get current session information"""
-        response = self._session.get(
-            f"{self.api_url}/api/v1/session",
+        response = self._get(
+            self._url_session,
             timeout=self.timeout,
         )
 
@@ -276,13 +625,13 @@ class CAGEClient:
 
     def create_session(self, language: str = "python", reset_workspace: bool = False) -> Dict[str, Any]:
         """Create or restart session"""
-        payload = {
+        payload: Dict[str, Any] = {
             "language": language,
             "reset_workspace": reset_workspace,
         }
 
-        response = self._session.post(
-            f"{self.api_url}/api/v1/session",
+        response = self._post(
+            self._url_session,
             json=payload,
             timeout=self.timeout,
         )
@@ -292,12 +641,12 @@ class CAGEClient:
 
         return response.json()
 
-    def terminate_session(self, purge_data: bool = False):
+    def terminate_session(self, purge_data: bool = False) -> None:
         """Terminate current session"""
         params = {"purge_data": str(purge_data).lower()}
 
-        response = self._session.delete(
-            f"{self.api_url}/api/v1/session",
+        response = self._delete(
+            self._url_session,
             params=params,
             timeout=self.timeout,
         )
@@ -307,8 +656,8 @@ class CAGEClient:
 
     def health(self) -> Dict[str, Any]:
         """Get server health status"""
-        response = requests.get(
-            f"{self.api_url}/health",
+        response = self._get(
+            self._url_health,
             timeout=self.timeout,
         )
 
@@ -317,10 +666,10 @@ class CAGEClient:
 
         return response.json()
 
-    def __enter__(self):
+    def __enter__(self) -> "CAGEClient":
         """Context manager support"""
         return self
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
+    def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
         """Cleanup on context manager exit"""
         self._session.close()
@@ -1,16 +1,69 @@
 """CAGE MCP (Model Context Protocol) Client"""
 
 import asyncio
+import base64
+import functools
 import json
-import uuid
-from typing import Dict, List, Optional, Any
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, Final, List, Optional, Any, Set, Tuple
+
+from .client import CAGEError
 
 try:
     import websockets
 except ImportError:
-    websockets = None
+    websockets = None  # type: ignore[assignment]
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None  # type: ignore[assignment]
+
+try:
+    from mypy_extensions import mypyc_attr
+except ImportError:
+    # Only the mypyc build needs the real decorator
+    def mypyc_attr(*attrs: str, **kwattrs: object) -> Any:  # type: ignore[misc]
+        return lambda cls: cls
+
+
+# The orchestrator only reads text frames, so frames are always sent as str.
+if orjson is not None:
+    def _dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+    _loads = orjson.loads
+else:
+    _dumps = json.dumps
+    _loads = json.loads
+
+
+# Hot-path requests are serialized from prebuilt text with "id" placed last,
+# so only the variable parts are encoded per call.
+_TOOLS_LIST_PREFIX: Final = '{"jsonrpc":"2.0","method":"tools/list","id":'
+
+
+@functools.lru_cache(maxsize=64, typed=True)
+def _execute_code_prefix(language: str, persistent: bool, timeout_seconds: int) -> str:
+    """Request text for execute_code up to (not including) the code value"""
+    arguments = _dumps({
+        "language": language,
+        "persistent": persistent,
+        "timeout_seconds": timeout_seconds,
+    })
+    return (
+        '{"jsonrpc":"2.0","method":"tools/call","params":{"name":"execute_code",'
+        '"arguments":' + arguments[:-1] + ',"code":'
+    )
 
 
+@mypyc_attr(allow_interpreted_subclasses=True)
 class MCPClient:
     """
     CAGE MCP WebSocket Client
@@ -23,12 +76,28 @@ class MCPClient:
         ...         result = await client.execute_code("print('Hello')")
         ...         print(result)
         >>> asyncio.run(main())
+
+    Instances use ``__slots__``; subclasses should declare ``__slots__`` for
+    any attributes they add to keep the per-instance savings.
     """
 
+    __slots__ = (
+        "api_url",
+        "user_id",
+        "use_msgpack",
+        "ws",
+        "_msg_id",
+        "_binary_frames",
+        "_pending",
+        "_abandoned",
+        "_reader",
+    )
+
     def __init__(
         self,
         api_url: str = "ws://127.0.0.1:8080/mcp",
         user_id: str = "default",
+        use_msgpack: bool = False,
     ):
         """
         Initialize MCP client
@@ -36,30 +105,43 @@ class MCPClient:
         Args:
             api_url: WebSocket URL of CAGE MCP endpoint
             user_id: User identifier for authentication
+            use_msgpack: Send execute_code and upload_file as MessagePack
+                binary frames when the server advertises the ``msgpack``
+                capability (uploads then skip base64)
         """
         if websockets is None:
             raise ImportError("websockets library required. Install with: pip install websockets")
+        if use_msgpack and msgpack is None:
+            raise ImportError("msgpack library required. Install with: pip install msgpack")
 
         self.api_url = api_url
         self.user_id = user_id
-        self.ws = None
+        self.use_msgpack = use_msgpack
+        self.ws: Any = None
         self._msg_id = 0
-
-    async def __aenter__(self):
+        self._binary_frames = False
+        # Requests awaiting a response, in send order; filled in by _read_loop
+        self._pending: Dict[int, asyncio.Future] = {}
+        # Ids of cancelled requests whose late responses are dropped
+        self._abandoned: Set[int] = set()
+        self._reader: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "MCPClient":
         """Async context manager entry"""
         await self.connect()
         return self
 
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
         """Async context manager exit"""
         await self.close()
 
-    async def connect(self):
+    async def connect(self) -> Dict[str, Any]:
         """Connect to CAGE MCP WebSocket"""
         self.ws = await websockets.connect(self.api_url)
+        self._reader = asyncio.create_task(self._read_loop())
 
         # Send initialize
-        init_response = await self._send_request("initialize", {
+        init_response = await self._rpc("initialize", {
             "user_id": self.user_id,
             "clientInfo": {
                 "name": "CAGE Python SDK",
@@ -70,11 +152,16 @@ class MCPClient:
         if "error" in init_response:
             raise Exception(f"Initialize failed: {init_response['error']}")
 
+        capabilities = init_response["result"].get("capabilities", {})
+        # MCP capabilities are advertised by key presence, usually with an empty object
+        self._binary_frames = self.use_msgpack and "msgpack" in capabilities.get("experimental", {})
+
         return init_response["result"]
 
     async def list_tools(self) -> List[Dict[str, Any]]:
         """List available tools"""
-        response = await self._send_request("tools/list")
+        self._msg_id += 1
+        response = await self._exchange(f"{_TOOLS_LIST_PREFIX}{self._msg_id}}}", self._msg_id)
 
         if "error" in response:
             raise Exception(f"List tools failed: {response['error']}")
@@ -100,45 +187,95 @@ class MCPClient:
         Returns:
             Execution result
         """
-        response = await self._call_tool("execute_code", {
-            "code": code,
-            "language": language,
-            "persistent": persistent,
-            "timeout_seconds": timeout_seconds,
-        })
+        if self._binary_frames:
+            response = await self._rpc("tools/call", {
+                "name": "execute_code",
+                "arguments": {
+                    "code": code,
+                    "language": language,
+                    "persistent": persistent,
+                    "timeout_seconds": timeout_seconds,
+                },
+            }, binary=True)
+        else:
+            self._msg_id += 1
+            prefix = _execute_code_prefix(language, persistent, timeout_seconds)
+            frame = f'{prefix}{_dumps(code)}}}}},"id":{self._msg_id}}}'
+            response = await self._exchange(frame, self._msg_id)
 
         if "error" in response:
             raise Exception(f"Execution failed: {response['error']}")
 
         return response["result"]
 
+    async def execute_code_many(
+        self,
+        codes: List[str],
+        language: str = "python",
+        persistent: bool = False,
+        timeout_seconds: int = 30,
+    ) -> List[Dict[str, Any]]:
+        """
+        Execute several snippets pipelined over this connection
+
+        Returns:
+            Execution results in the same order as ``codes``
+        """
+        return await asyncio.gather(*(
+            self.execute_code(code, language, persistent, timeout_seconds)
+            for code in codes
+        ))
+
     async def list_files(self, path: str = "/") -> Dict[str, Any]:
         """List workspace files via MCP"""
-        response = await self._call_tool("list_files", {"path": path})
+        response = await self._rpc("tools/call", {
+            "name": "list_files",
+            "arguments": {"path": path},
+        })
 
         if "error" in response:
             raise Exception(f"List files failed: {response['error']}")
 
         # Parse the text content which contains JSON
         content_text = response["result"]["content"][0]["text"]
-        return json.loads(content_text)
+        return _loads(content_text)
 
     async def upload_file(self, filename: str, content: bytes) -> Dict[str, Any]:
-        """Upload file via MCP (base64 encoded)"""
-        content_b64 = base64.b64encode(content).decode('utf-8')
+        """
+        Upload file via MCP
 
-        response = await self._call_tool("upload_file", {
-            "filename": filename,
-            "content": content_b64,
-        })
+        Sent as raw MessagePack ``bin`` data when binary frames were negotiated
+        (see ``use_msgpack``), otherwise base64 encoded inside JSON.
+        """
+        if self._binary_frames:
+            response = await self._rpc("tools/call", {
+                "name": "upload_file",
+                "arguments": {
+                    "filename": filename,
+                    "content": content,
+                },
+            }, binary=True)
+        else:
+            response = await self._rpc("tools/call", {
+                "name": "upload_file",
+                "arguments": {
+                    "filename": filename,
+                    "content": base64.b64encode(content).decode('utf-8'),
+                },
+            })
 
         if "error" in response:
             raise Exception(f"Upload failed: {response['error']}")
 
         return response["result"]
 
-    async def _send_request(self, method: str, params: Optional[Dict] = None) -> Dict:
-        """Send JSON-RPC 2.0 request"""
+    async def _rpc(
+        self,
+        method: str,
+        params: Optional[Dict] = None,
+        binary: bool = False,
+    ) -> Dict:
+        """Send JSON-RPC 2.0 request (as a MessagePack binary frame if ``binary``)"""
         self._msg_id += 1
 
         request = {
@@ -150,18 +287,235 @@ class MCPClient:
         if params is not None:
             request["params"] = params
 
-        await self.ws.send(json.dumps(request))
-        response_text = await self.ws.recv()
-        return json.loads(response_text)
-
-    async def _call_tool(self, tool_name: str, arguments: Dict) -> Dict:
-        """Call an MCP tool"""
-        return await self._send_request("tools/call", {
-            "name": tool_name,
-            "arguments": arguments,
-        })
-
-    async def close(self):
+        if binary:
+            return await self._exchange(msgpack.packb(request, use_bin_type=True), self._msg_id)
+        return await self._exchange(_dumps(request), self._msg_id)
+
+    async def _exchange(self, frame: Any, msg_id: int) -> Dict:
+        """Send a serialized request and wait for the response with the same id"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending[msg_id] = future
+        try:
+            await self.ws.send(frame)
+            return await future
+        except asyncio.CancelledError:
+            if not future.done():
+                self._abandoned.add(msg_id)
+            raise
+        finally:
+            self._pending.pop(msg_id, None)
+
+    async def _read_loop(self) -> None:
+        """Route incoming responses to pending requests by id"""
+        error: BaseException = CAGEError("MCP connection closed")
+        try:
+            async for reply in self.ws:
+                try:
+                    response = msgpack.unpackb(reply, raw=False) if isinstance(reply, bytes) else _loads(reply)
+                except Exception:
+                    # Malformed frame; nothing to route it to
+                    continue
+                if not isinstance(response, dict):
+                    continue
+
+                reply_id: Any = response.get("id")
+                future = self._pending.pop(reply_id, None)
+
+                if future is None:
+                    if reply_id in self._abandoned:
+                        # Late answer to a cancelled request
+                        self._abandoned.discard(reply_id)
+                        continue
+                    if "method" in response or not self._pending:
+                        # Notification, or nothing left to answer
+                        continue
+
+                    # The server answers in order, so an unmatched reply belongs to
+                    # the oldest request. Errors it could not attribute (e.g. parse
+                    # errors) carry a null id and are delivered as-is; a reply under
+                    # an id never issued fails the request instead of leaving it
+                    # waiting forever. Stale duplicates of issued ids are dropped.
+                    oldest_id = next(iter(self._pending))
+                    if reply_id is None:
+                        if "error" in response:
+                            future = self._pending.pop(oldest_id)
+                    elif not isinstance(reply_id, int) or reply_id > self._msg_id:
+                        future = self._pending.pop(oldest_id)
+                        if not future.done():
+                            future.set_exception(CAGEError(
+                                f"response id {reply_id} does not match request {oldest_id}"
+                            ))
+                        continue
+
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except websockets.exceptions.ConnectionClosed as e:
+            error = e
+        except Exception as e:
+            # Without a reader nothing is ever answered again; make that visible
+            error = CAGEError(f"MCP reader failed: {e}")
+            await self.ws.close()
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+
+    @property
+    def connected(self) -> bool:
+        """Whether the WebSocket is open and its responses are being read"""
+        return (
+            self.ws is not None
+            and self.ws.close_code is None
+            and self._reader is not None
+            and not self._reader.done()
+        )
+
+    async def close(self) -> None:
         """Close WebSocket connection"""
         if self.ws:
             await self.ws.close()
+        if self._reader:
+            self._reader.cancel()
+            self._reader = None
+
+
+class MCPSessionPool:
+    """
+    Pool of initialized MCP connections keyed by (api_url, user_id)
+
+    Reusing a connection skips the WebSocket handshake and the ``initialize``
+    round-trip. Idle connections are closed after ``max_idle`` seconds, and at
+    most ``max_per_user`` idle connections are kept per key.
+
+    Example:
+        >>> pool = MCPSessionPool()
+        >>> async def main():
+        ...     async with pool.session("ws://127.0.0.1:8080/mcp", "demo") as client:
+        ...         await client.execute_code("print('Hello')")
+        ...     await pool.close()
+        >>> asyncio.run(main())
+    """
+
+    def __init__(self, max_idle: float = 300, max_per_user: int = 4):
+        """
+        Initialize session pool
+
+        Args:
+            max_idle: Seconds an idle connection is kept before being closed
+            max_per_user: Maximum idle connections kept per (api_url, user_id)
+        """
+        self.max_idle = max_idle
+        self.max_per_user = max_per_user
+        self._idle: Dict[Tuple[str, str], Deque[Tuple[MCPClient, float]]] = defaultdict(deque)
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    async def acquire(self, api_url: str, user_id: str) -> MCPClient:
+        """Get a connected client, reusing an idle one when available"""
+        self._ensure_reaper()
+
+        idle = self._idle.get((api_url, user_id))
+        while idle:
+            client, _ = idle.pop()
+            if client.connected:
+                self._hits += 1
+                return client
+            self._evictions += 1
+
+        self._misses += 1
+        client = MCPClient(api_url=api_url, user_id=user_id)
+        try:
+            await client.connect()
+        except BaseException:
+            # Don't leak the socket or its reader task
+            await client.close()
+            raise
+        return client
+
+    async def release(self, client: MCPClient) -> None:
+        """Return a client to the pool (closed if the pool is full)"""
+        idle = self._idle[(client.api_url, client.user_id)]
+
+        if not client.connected or len(idle) >= self.max_per_user:
+            self._evictions += 1
+            await client.close()
+            return
+
+        idle.append((client, time.monotonic()))
+
+    def session(self, api_url: str, user_id: str) -> "_PooledSession":
+        """Borrow a client for the duration of an ``async with`` block"""
+        return _PooledSession(self, api_url, user_id)
+
+    async def _discard(self, client: MCPClient) -> None:
+        """Close a client that must not be handed out again"""
+        self._evictions += 1
+        await client.close()
+
+    def get_pool_metrics(self) -> Dict[str, int]:
+        """Pool hit/miss/eviction counters and current idle size"""
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "idle": sum(len(idle) for idle in self._idle.values()),
+        }
+
+    async def close(self) -> None:
+        """Stop the reaper and close all idle connections"""
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            self._reaper_task = None
+
+        for idle in list(self._idle.values()):
+            while idle:
+                client, _ = idle.popleft()
+                await client.close()
+        self._idle.clear()
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.create_task(self._reaper())
+
+    async def _reaper(self) -> None:
+        """Close connections idle for longer than max_idle"""
+        while True:
+            # Floor of 1s so a max_idle of 0 or less can't spin the loop
+            await asyncio.sleep(max(min(self.max_idle, 30), 1))
+            cutoff = time.monotonic() - self.max_idle
+
+            for idle in list(self._idle.values()):
+                # Oldest entries sit at the left end of each deque
+                while idle and idle[0][1] < cutoff:
+                    client, _ = idle.popleft()
+                    self._evictions += 1
+                    await client.close()
+
+
+class _PooledSession:
+    """Async context manager returned by MCPSessionPool.session()"""
+
+    __slots__ = ("pool", "api_url", "user_id", "client")
+
+    def __init__(self, pool: MCPSessionPool, api_url: str, user_id: str):
+        self.pool = pool
+        self.api_url = api_url
+        self.user_id = user_id
+        self.client: Optional[MCPClient] = None
+
+    async def __aenter__(self) -> MCPClient:
+        self.client = await self.pool.acquire(self.api_url, self.user_id)
+        return self.client
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        client, self.client = self.client, None
+        if client is None:
+            return
+        if exc_type is not None:
+            # The connection may be mid-request; don't hand it out again
+            await self.pool._discard(client)
+        else:
+            await self.pool.release(client)
@@ -1,11 +1,24 @@
 #!/usr/bin/env python3
 """Setup script for CAGE Python SDK"""
 
+import os
+
 from setuptools import setup, find_packages
 
 with open("README.md", "r", encoding="utf-8") as fh:
     long_description = fh.read()
 
+# Opt-in mypyc build of the hot modules; the default is a pure-Python package
+ext_modules = []
+if os.environ.get("CAGE_SDK_COMPILE") == "1":
+    from mypyc.build import mypycify
+
+    ext_modules = mypycify([
+        "--ignore-missing-imports",
+        "cage/client.py",
+        "cage/mcp.py",
+    ])
+
 setup(
     name="cage-sdk",
     version="1.0.0",
@@ -16,6 +29,7 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/cage-project/cage",
     packages=find_packages(),
+    ext_modules=ext_modules,
     classifiers=[
         "Development Status :: 5 - Production/Stable",
         "Intended Audience :: Developers",
@@ -34,5 +48,10 @@ setup(
     ],
     extras_require={
         "dev": ["pytest>=7.0", "black", "mypy", "flake8"],
+        "fast": ["orjson>=3.8"],
+        "msgpack": ["msgpack>=1.0"],
+        "stream": ["requests-toolbelt>=1.0"],
+        "async": ["httpx[http2]>=0.24"],
+        "zstd": ["zstandard>=0.21"],
     },
 )
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""CAGEClient wire behaviour against a local stub HTTP server"""
+
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import tarfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from cage import AsyncCAGEClient, CAGEClient, CAGEError, ExecutionError
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """JSON orchestrator that refuses compressed request bodies (unless
+    decode_bodies is set) and MessagePack ones (unless speaks_msgpack is set),
+    and serves workspace files with SHA-256 ETags"""
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_payload(self, status, body):
+        """Answer in MessagePack when enabled and accepted, else JSON"""
+        if not (self.server.speaks_msgpack and "application/msgpack" in self.headers.get("Accept", "")):
+            self._send_json(status, body)
+            return
+        import msgpack
+        data = msgpack.packb(body, use_bin_type=True)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/msgpack")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        if self.path.startswith("/api/v1/files/archive?") and self.server.archive is not None:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zstd")
+            self.send_header("Content-Length", str(len(self.server.archive)))
+            self.end_headers()
+            self.wfile.write(self.server.archive)
+            return
+
+        content = self.server.files.get(self.path[len("/api/v1/files/"):])
+        if content is None:
+            self._send_json(404, {"message": "not found"})
+            return
+
+        etag = f'"{hashlib.sha256(content).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        if self.server.truncate_downloads:
+            # Promise more than is sent, then hang up mid-body
+            self.send_header("Content-Length", str(len(content) + 100))
+            self.close_connection = True
+        else:
+            self.send_header("Content-Length", str(len(content)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests.append((self.path, dict(self.headers)))
+        encoding = self.headers.get("Content-Encoding")
+        if encoding and not self.server.decode_bodies:
+            self._send_json(415, {"message": "unsupported content encoding"})
+            return
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        elif encoding == "zstd":
+            import zstandard
+            body = zstandard.ZstdDecompressor().decompress(body)
+        if self.headers.get("Content-Type") == "application/msgpack":
+            if not self.server.speaks_msgpack:
+                self._send_json(415, {"message": "unsupported media type"})
+                return
+            import msgpack
+            payload = msgpack.unpackb(body, raw=False)
+        else:
+            payload = json.loads(body)
+        if payload["language"] == "bogus":
+            self._send_payload(400, {"message": "unsupported language"})
+            return
+        self._send_payload(200, {"status": "success", "stdout": payload["code"], "exit_code": 0})
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    httpd.requests = []
+    httpd.files = {"data.txt": b"hello"}
+    httpd.archive = None
+    httpd.decode_bodies = False
+    httpd.speaks_msgpack = False
+    httpd.truncate_downloads = False
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _client(server, **kwargs):
+    return CAGEClient(api_url=f"http://127.0.0.1:{server.server_port}", api_key="test", timeout=5, **kwargs)
+
+
+def test_rejected_compression_falls_back_to_plain_bodies(server):
+    client = _client(server, compress_requests=True)
+    code = "x = 1\n" * 2000
+
+    assert client.execute(code)["stdout"] == code
+    assert not client.compress_requests
+    assert [bool(headers.get("Content-Encoding")) for _, headers in server.requests] == [True, False]
+
+    assert client.execute(code)["stdout"] == code
+    assert "Content-Encoding" not in server.requests[-1][1]
+
+
+def test_validation_error_keeps_compression(server):
+    server.decode_bodies = True
+    client = _client(server, compress_requests=True)
+    code = "x = 1\n" * 2000
+
+    with pytest.raises(ExecutionError, match="unsupported language"):
+        client.execute(code, language="bogus")
+    assert len(server.requests) == 1
+    assert client.compress_requests
+
+    assert client.execute(code)["stdout"] == code
+    assert server.requests[-1][1].get("Content-Encoding")
+
+
+def _content_types(server):
+    return [headers.get("Content-Type") for _, headers in server.requests]
+
+
+def test_msgpack_falls_back_to_json_on_415(server):
+    pytest.importorskip("msgpack")
+    client = _client(server, use_msgpack=True)
+
+    assert client.execute("print(1)")["stdout"] == "print(1)"
+    assert not client.use_msgpack
+    assert _content_types(server) == ["application/msgpack", "application/json"]
+
+    client.execute("print(2)")
+    assert _content_types(server)[-1] == "application/json"
+
+
+def test_msgpack_responses_are_decoded(server):
+    pytest.importorskip("msgpack")
+    server.speaks_msgpack = True
+    client = _client(server, use_msgpack=True)
+    code = 'print("héllo ✓")'
+
+    assert client.execute(code) == {"status": "success", "stdout": code, "exit_code": 0}
+    assert client.use_msgpack
+    assert _content_types(server) == ["application/msgpack"]
+
+    # Error bodies are decoded by their Content-Type too
+    with pytest.raises(ExecutionError, match="unsupported language"):
+        client.execute(code, language="bogus")
+
+
+def test_swapped_session_is_used_for_requests(server):
+    client = _client(server)
+    session = requests.Session()
+    session.headers["X-Swapped"] = "yes"
+
+    client._session = session
+
+    assert client._session is session
+    assert client.download_file("data.txt") == b"hello"
+    assert server.requests[-1][1].get("X-Swapped") == "yes"
+
+
+def test_async_execute_and_execute_many(server):
+    pytest.importorskip("httpx")
+    pytest.importorskip("h2")
+
+    async def main():
+        url = f"http://127.0.0.1:{server.server_port}"
+        async with AsyncCAGEClient(api_url=url, api_key="test", timeout=5) as client:
+            assert (await client.execute("print(0)"))["stdout"] == "print(0)"
+            results = await client.execute_many([f"print({i})" for i in range(1, 6)])
+        return results
+
+    results = asyncio.run(main())
+
+    assert [result["stdout"] for result in results] == [f"print({i})" for i in range(1, 6)]
+    assert len(server.requests) == 6
+    assert all(path == "/api/v1/execute" for path, _ in server.requests)
+    assert all(headers["Authorization"] == "ApiKey test" for _, headers in server.requests)
+
+
+def _sent_etags(server):
+    return [headers.get("If-None-Match") for _, headers in server.requests]
+
+
+def test_unchanged_download_is_served_from_cache(server):
+    client = _client(server)
+
+    assert client.download_file("data.txt") == b"hello"
+    assert client.download_file("data.txt") == b"hello"
+
+    etag = f'"{hashlib.sha256(b"hello").hexdigest()}"'
+    assert _sent_etags(server) == [None, etag]
+
+
+def test_changed_download_replaces_cached_body(server):
+    client = _client(server)
+
+    assert client.download_file("data.txt") == b"hello"
+    server.files["data.txt"] = b"changed"
+    assert client.download_file("data.txt") == b"changed"
+    assert client.download_file("data.txt") == b"changed"
+    assert client._etag_cache_bytes == len(b"changed")
+
+
+def test_download_cache_can_be_disabled(server):
+    client = _client(server, cache_downloads=False)
+
+    assert client.download_file("data.txt") == b"hello"
+    assert client.download_file("data.txt") == b"hello"
+    assert _sent_etags(server) == [None, None]
+    assert not client._etag_cache
+
+
+def test_existing_output_file_is_revalidated(server, tmp_path):
+    client = _client(server)
+    output = tmp_path / "data.txt"
+
+    client.download_file("data.txt", str(output))
+    mtime = output.stat().st_mtime_ns
+    client.download_file("data.txt", str(output))
+
+    assert output.read_bytes() == b"hello"
+    assert output.stat().st_mtime_ns == mtime
+    assert _sent_etags(server)[1] is not None
+
+
+def test_interrupted_download_keeps_previous_output(server, tmp_path):
+    output = tmp_path / "data.txt"
+    output.write_bytes(b"previous copy")
+    server.files["data.txt"] = b"new content"
+    server.truncate_downloads = True
+    client = _client(server)
+
+    with pytest.raises(requests.RequestException):
+        client.download_file("data.txt", str(output))
+
+    assert output.read_bytes() == b"previous copy"
+    assert [path.name for path in tmp_path.iterdir()] == ["data.txt"]
+
+
+def _tar_zst(*members):
+    """Build a zstd-compressed tar from (TarInfo, content) pairs"""
+    zstandard = pytest.importorskip("zstandard")
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for info, content in members:
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return zstandard.ZstdCompressor().compress(buffer.getvalue())
+
+
+def _member(name, type=tarfile.REGTYPE, linkname=""):
+    info = tarfile.TarInfo(name)
+    info.type = type
+    info.linkname = linkname
+    return info
+
+
+@pytest.fixture(params=["data_filter", "manual"])
+def extract_branch(request, monkeypatch):
+    """Run archive tests with and without tarfile's extraction filters"""
+    if request.param == "manual":
+        monkeypatch.delattr(tarfile, "data_filter", raising=False)
+    elif not hasattr(tarfile, "data_filter"):
+        pytest.skip("tarfile extraction filters not available")
+    return request.param
+
+
+def test_download_tree_extracts_archive(server, tmp_path, extract_branch):
+    server.archive = _tar_zst(
+        (_member("pkg", tarfile.DIRTYPE), b""),
+        (_member("pkg/ok.txt"), b"fine"),
+    )
+    client = _client(server)
+
+    client.download_tree("/", str(tmp_path / "out"))
+
+    assert (tmp_path / "out" / "pkg" / "ok.txt").read_bytes() == b"fine"
+
+
+@pytest.mark.parametrize(
+    "malicious",
+    [
+        (_member("../evil"), b"pwned"),
+        (_member("link", tarfile.SYMTYPE, linkname="/etc/passwd"), b""),
+        (_member("uplink", tarfile.SYMTYPE, linkname="../evil"), b""),
+    ],
+    ids=["parent-path", "absolute-symlink", "escaping-symlink"],
+)
+def test_download_tree_refuses_escaping_members(server, tmp_path, extract_branch, malicious):
+    server.archive = _tar_zst((_member("ok.txt"), b"fine"), malicious)
+    client = _client(server)
+
+    with pytest.raises(CAGEError):
+        client.download_tree("/", str(tmp_path / "out"))
+
+    assert not (tmp_path / "evil").exists()
+    assert not (tmp_path / "out" / "link").exists()
+    assert not (tmp_path / "out" / "uplink").exists()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""MCPClient response routing against a local stub MCP server"""
+
+import asyncio
+import base64
+import json
+
+import pytest
+
+websockets = pytest.importorskip("websockets")
+
+import cage.mcp
+from cage import CAGEError, MCPClient, MCPSessionPool
+
+
+async def _stub_handler(ws):
+    """Minimal MCP server with a few misbehaving replies"""
+    async for message in ws:
+        request = json.loads(message)
+        method = request["method"]
+
+        if method == "initialize":
+            result = {"capabilities": {"tools": {}}}
+        elif method == "tools/list":
+            # Id-less notification ahead of the real answer
+            await ws.send(json.dumps({"jsonrpc": "2.0", "method": "notifications/progress", "params": {}}))
+            result = {"tools": [{"name": "execute_code"}]}
+        else:
+            # Malformed and non-object frames ahead of the real answer
+            await ws.send("{not json")
+            await ws.send("[1, 2, 3]")
+            arguments = request["params"]["arguments"]
+            result = {"content": [{"type": "text", "text": arguments["code"]}], "arguments": arguments}
+
+        await ws.send(json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": result}))
+
+
+async def _offset_id_handler(ws):
+    """Answers everything except initialize under the wrong id"""
+    async for message in ws:
+        request = json.loads(message)
+        if request["method"] == "initialize":
+            reply = {"jsonrpc": "2.0", "id": request["id"], "result": {"capabilities": {}}}
+        else:
+            reply = {"jsonrpc": "2.0", "id": request["id"] + 100, "result": {"tools": []}}
+        await ws.send(json.dumps(reply))
+
+
+async def _delayed_handler(ws):
+    """Answers each request concurrently after a delay, so replies can arrive
+    out of order; execute_code("sleep:N") waits N seconds, tools/list 0.3"""
+    async def answer(request):
+        method = request["method"]
+        if method == "initialize":
+            result = {"capabilities": {"tools": {}}}
+        elif method == "tools/list":
+            await asyncio.sleep(0.3)
+            result = {"tools": [{"name": "execute_code"}]}
+        else:
+            code = request["params"]["arguments"]["code"]
+            await asyncio.sleep(float(code.split(":")[1]))
+            result = {"content": [{"type": "text", "text": code}]}
+        await ws.send(json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": result}))
+
+    tasks = set()
+    async for message in ws:
+        task = asyncio.create_task(answer(json.loads(message)))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+
+def _msgpack_handler(frames, advertise=True):
+    """Echoes tools/call arguments, answering MessagePack frames in kind;
+    records each request as (was_binary, request) in ``frames``"""
+    import msgpack
+
+    async def handler(ws):
+        async for message in ws:
+            binary = isinstance(message, bytes)
+            request = msgpack.unpackb(message, raw=False) if binary else json.loads(message)
+            frames.append((binary, request))
+
+            if request["method"] == "initialize":
+                capabilities = {"tools": {}}
+                if advertise:
+                    capabilities["experimental"] = {"msgpack": {}}
+                result = {"capabilities": capabilities}
+            else:
+                result = {"arguments": request["params"]["arguments"]}
+
+            reply = {"jsonrpc": "2.0", "id": request["id"], "result": result}
+            if binary:
+                await ws.send(msgpack.packb(reply, use_bin_type=True))
+            else:
+                await ws.send(json.dumps(reply))
+
+    return handler
+
+
+def _run_with_server(scenario, handler=_stub_handler, **client_kwargs):
+    async def main():
+        async with websockets.serve(handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            async with MCPClient(api_url=f"ws://127.0.0.1:{port}", user_id="test", **client_kwargs) as client:
+                await asyncio.wait_for(scenario(client), timeout=5)
+
+    asyncio.run(main())
+
+
+def test_notifications_are_not_taken_as_responses():
+    async def scenario(client):
+        assert await client.list_tools() == [{"name": "execute_code"}]
+
+    _run_with_server(scenario)
+
+
+def test_malformed_frames_are_skipped():
+    async def scenario(client):
+        result = await client.execute_code("print(1)")
+        assert result["content"][0]["text"] == "print(1)"
+        assert client.connected
+        assert await client.list_tools() == [{"name": "execute_code"}]
+
+    _run_with_server(scenario)
+
+
+def test_reader_failure_closes_connection():
+    class ExplodingPending(dict):
+        """Fails the first lookup, which the reader task makes"""
+
+        exploded = False
+
+        def pop(self, *args):
+            if not self.exploded:
+                self.exploded = True
+                raise RuntimeError("boom")
+            return super().pop(*args)
+
+    async def scenario(client):
+        client._pending = ExplodingPending()
+
+        with pytest.raises(CAGEError, match="reader failed"):
+            await client.list_tools()
+
+        assert not client.connected
+        assert client.ws.close_code is not None
+
+    _run_with_server(scenario)
+
+
+def test_mismatched_response_id_raises():
+    async def scenario(client):
+        with pytest.raises(CAGEError, match=r"response id 102 does not match request 2"):
+            await client.list_tools()
+        assert client.connected
+
+    _run_with_server(scenario, _offset_id_handler)
+
+
+def test_late_reply_to_cancelled_request_is_dropped():
+    async def scenario(client):
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.execute_code("sleep:0.1"), 0.01)
+
+        # The cancelled request's reply arrives while this one is pending
+        assert await client.list_tools() == [{"name": "execute_code"}]
+        assert client.connected
+        assert not client._abandoned
+
+    _run_with_server(scenario, _delayed_handler)
+
+
+def test_out_of_order_replies_reach_their_callers():
+    async def scenario(client):
+        slow, fast, tools = await asyncio.gather(
+            client.execute_code("sleep:0.2"),
+            client.execute_code("sleep:0"),
+            client.list_tools(),
+        )
+        assert slow["content"][0]["text"] == "sleep:0.2"
+        assert fast["content"][0]["text"] == "sleep:0"
+        assert tools == [{"name": "execute_code"}]
+
+    _run_with_server(scenario, _delayed_handler)
+
+
+def test_execute_code_many_keeps_input_order():
+    async def scenario(client):
+        codes = ["sleep:0.2", "sleep:0.1", "sleep:0"]
+        results = await client.execute_code_many(codes)
+        assert [result["content"][0]["text"] for result in results] == codes
+        assert not client._pending
+
+    _run_with_server(scenario, _delayed_handler)
+
+
+def test_execute_code_uses_binary_frames_when_advertised():
+    pytest.importorskip("msgpack")
+    frames = []
+
+    async def scenario(client):
+        result = await client.execute_code("print(1)", timeout_seconds=5)
+        assert result["arguments"] == {
+            "code": "print(1)",
+            "language": "python",
+            "persistent": False,
+            "timeout_seconds": 5,
+        }
+
+    _run_with_server(scenario, _msgpack_handler(frames), use_msgpack=True)
+    assert [binary for binary, _ in frames] == [False, True]
+
+
+def test_execute_code_stays_on_text_frames_without_capability():
+    pytest.importorskip("msgpack")
+    frames = []
+
+    async def scenario(client):
+        result = await client.execute_code("print(1)")
+        assert result["arguments"]["code"] == "print(1)"
+
+    _run_with_server(scenario, _msgpack_handler(frames, advertise=False), use_msgpack=True)
+    assert [binary for binary, _ in frames] == [False, False]
+
+
+def test_upload_file_sends_raw_bytes_when_advertised():
+    pytest.importorskip("msgpack")
+    frames = []
+    content = bytes(range(256)) * 4
+
+    async def scenario(client):
+        result = await client.upload_file("data.bin", content)
+        assert result["arguments"] == {"filename": "data.bin", "content": content}
+
+    _run_with_server(scenario, _msgpack_handler(frames), use_msgpack=True)
+
+    binary, request = frames[-1]
+    assert binary
+    assert request["params"]["name"] == "upload_file"
+    assert type(request["params"]["arguments"]["content"]) is bytes
+    assert request["params"]["arguments"]["content"] == content
+
+
+def test_upload_file_falls_back_to_base64_without_capability():
+    pytest.importorskip("msgpack")
+    frames = []
+    content = b"\x00\xffpayload"
+
+    async def scenario(client):
+        await client.upload_file("data.bin", content)
+
+    _run_with_server(scenario, _msgpack_handler(frames, advertise=False), use_msgpack=True)
+
+    binary, request = frames[-1]
+    assert not binary
+    assert base64.b64decode(request["params"]["arguments"]["content"]) == content
+
+
+@pytest.fixture(params=["json", "orjson"])
+def frame_dumps(request, monkeypatch):
+    """Build execute_code frames with each supported serializer"""
+    if request.param == "orjson":
+        orjson = pytest.importorskip("orjson")
+        monkeypatch.setattr(cage.mcp, "_dumps", lambda obj: orjson.dumps(obj).decode("utf-8"))
+    else:
+        monkeypatch.setattr(cage.mcp, "_dumps", json.dumps)
+    cage.mcp._execute_code_prefix.cache_clear()
+    yield request.param
+    cage.mcp._execute_code_prefix.cache_clear()
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        'print("double") or print(\'single\')',
+        "d = {'a': {'b': [1, 2]}}\nprint(f\"{d}}}{{\")",
+        'print("héllo wörld ✓ 你好 🚀")',
+        "path = 'C:\\\\temp'\t# \"\\u0000\"",
+    ],
+    ids=["quotes", "braces", "non-ascii", "escapes"],
+)
+def test_execute_code_frames_are_valid_json(frame_dumps, code):
+    async def scenario(client):
+        result = await client.execute_code(code)
+        assert result["content"][0]["text"] == code
+        assert result["arguments"] == {
+            "code": code,
+            "language": "python",
+            "persistent": False,
+            "timeout_seconds": 30,
+        }
+
+        result = await client.execute_code(code, language="bash", persistent=True, timeout_seconds=5)
+        assert result["arguments"] == {
+            "code": code,
+            "language": "bash",
+            "persistent": True,
+            "timeout_seconds": 5,
+        }
+
+    _run_with_server(scenario)
+
+
+@pytest.mark.skipif(
+    not cage.mcp.__file__.endswith(".py"),
+    reason="the mypyc build rejects non-int timeouts before the cache",
+)
+def test_execute_code_prefix_keeps_argument_types(frame_dumps):
+    def arguments(persistent, timeout_seconds):
+        prefix = cage.mcp._execute_code_prefix("python", persistent, timeout_seconds)
+        return json.loads(prefix + '""}},"id":1}')["params"]["arguments"]
+
+    # Equal-but-differently-typed arguments must not share a cache entry
+    assert type(arguments(False, 30.0)["timeout_seconds"]) is float
+    assert type(arguments(False, 30)["timeout_seconds"]) is int
+    assert type(arguments(0, 30)["persistent"]) is int
+    assert type(arguments(False, 30)["persistent"]) is bool
+
+
+def _failing_init_handler(closed):
+    """Rejects initialize and reports when the client hangs up"""
+    async def handler(ws):
+        try:
+            async for message in ws:
+                request = json.loads(message)
+                await ws.send(json.dumps({"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32600, "message": "denied"}}))
+        finally:
+            closed.set()
+
+    return handler
+
+
+def _run_with_pool(scenario, handler=_stub_handler, **pool_kwargs):
+    async def main():
+        async with websockets.serve(handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            pool = MCPSessionPool(**pool_kwargs)
+            try:
+                await asyncio.wait_for(scenario(pool, f"ws://127.0.0.1:{port}"), timeout=5)
+            finally:
+                await pool.close()
+
+    asyncio.run(main())
+
+
+def test_pool_reuses_idle_clients():
+    async def scenario(pool, url):
+        async with pool.session(url, "a") as first:
+            await first.list_tools()
+        async with pool.session(url, "a") as second:
+            assert second is first
+        async with pool.session(url, "b") as other:
+            assert other is not first
+
+        assert pool.get_pool_metrics() == {"hits": 1, "misses": 2, "evictions": 0, "idle": 2}
+
+        # A connection that dropped while idle is evicted, not handed out
+        await first.close()
+        async with pool.session(url, "a") as third:
+            assert third is not first
+            assert third.connected
+
+        assert pool.get_pool_metrics() == {"hits": 1, "misses": 3, "evictions": 1, "idle": 2}
+
+    _run_with_pool(scenario)
+
+
+def test_pool_caps_idle_clients_per_user():
+    async def scenario(pool, url):
+        first = await pool.acquire(url, "a")
+        second = await pool.acquire(url, "a")
+        await pool.release(first)
+        await pool.release(second)
+
+        assert first.connected
+        assert not second.connected
+        assert pool.get_pool_metrics() == {"hits": 0, "misses": 2, "evictions": 1, "idle": 1}
+
+    _run_with_pool(scenario, max_per_user=1)
+
+
+def test_pool_discards_client_after_exception():
+    async def scenario(pool, url):
+        with pytest.raises(ValueError):
+            async with pool.session(url, "a") as client:
+                raise ValueError("boom")
+
+        assert not client.connected
+        assert pool.get_pool_metrics() == {"hits": 0, "misses": 1, "evictions": 1, "idle": 0}
+
+        async with pool.session(url, "a") as fresh:
+            assert fresh is not client
+        assert pool.get_pool_metrics()["misses"] == 2
+
+    _run_with_pool(scenario)
+
+
+def test_pool_closes_client_when_connect_fails():
+    closed = asyncio.Event()
+
+    async def scenario(pool, url):
+        with pytest.raises(Exception, match="Initialize failed"):
+            await pool.acquire(url, "a")
+
+        # The half-open client hung up instead of lingering with its reader
+        await asyncio.wait_for(closed.wait(), timeout=1)
+        assert pool.get_pool_metrics()["idle"] == 0
+
+    _run_with_pool(scenario, _failing_init_handler(closed))
+
+
+def test_pool_reaper_does_not_spin_with_zero_max_idle():
+    async def scenario(pool, url):
+        client = await pool.acquire(url, "a")
+        await pool.release(client)
+
+        # A spinning reaper would already have closed it
+        await asyncio.sleep(0.2)
+        assert pool.get_pool_metrics()["idle"] == 1
+
+        await asyncio.sleep(1.1)
+        assert pool.get_pool_metrics() == {"hits": 0, "misses": 1, "evictions": 1, "idle": 0}
+
+    _run_with_pool(scenario, max_idle=0)